@@ -0,0 +1,73 @@
+"""
+Partial-dependence (PD) and individual conditional expectation (ICE) curves.
+
+For a base sample and one predictor, all perturbed rows for the grid are
+built at once and scored with a single predict call per model, which returns
+every strength horizon. Results are memoized per (model version, base row,
+feature).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from registry import model_version
+from utils import FEATURES, MODEL_NAMES, predict_horizons
+
+GRID_POINTS = int(os.environ.get('DEPENDENCE_GRID_POINTS', 30))
+# dataset samples whose ICE curves are averaged into the PD curve
+ICE_SAMPLES = int(os.environ.get('DEPENDENCE_ICE_SAMPLES', 40))
+CACHE_SIZE = int(os.environ.get('DEPENDENCE_CACHE_SIZE', 256))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def feature_grid(Z, feature, base_value, points=GRID_POINTS):
+    """
+    Evenly spaced values over the 2nd-98th percentile of a feature, including the base value.
+    """
+    low, high = np.nanpercentile(Z[feature], [2, 98])
+    return np.unique(np.append(np.linspace(min(low, base_value), max(high, base_value), points), base_value))
+
+
+def compute_curves(plant, base_row, feature):
+    """
+    ICE curves of the base row and of ICE_SAMPLES dataset samples, and their PD.
+
+    Curves are (grid points, horizons) arrays, one column per plant target.
+    """
+    base = pd.DataFrame([base_row], columns=FEATURES).astype('float')
+    background = plant.Z.sample(min(ICE_SAMPLES, len(plant.Z)), random_state=0)
+    rows = pd.concat([base, background], ignore_index=True)
+    grid = feature_grid(plant.Z, feature, base[feature].iloc[0])
+
+    # every row repeated for every grid value, in one frame
+    X = rows.loc[rows.index.repeat(len(grid))].reset_index(drop=True)
+    X[feature] = np.tile(grid, len(rows))
+
+    curves = {}
+    for name, model in zip(MODEL_NAMES, plant.models):
+        ice = predict_horizons(model, X).reshape(len(rows), len(grid), -1)
+        curves[name] = {'base': ice[0], 'ice': ice[1:], 'pd': ice[1:].mean(axis=0)}
+    return {'feature': feature, 'targets': plant.targets, 'grid': grid, 'curves': curves}
+
+
+def dependence_curves(plant, base_row, feature):
+    """
+    Memoized compute_curves, keyed by model version, base row and feature.
+    """
+    key = (model_version(plant), tuple(float(v) for v in base_row), feature)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = compute_curves(plant, base_row, feature)
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,216 @@
+"""
+Streaming input-drift monitor.
+
+Each predictor gets a fixed set of bins cut at the training quantiles. The
+training data and the live requests scored by the app are counted into
+those bins, so memory is constant and recording a request costs
+O(features). PSI and KS drift scores are derived from the bin counts.
+
+Every worker process adds its new counts to a shared file per plant
+(DRIFT_DIR) at most every DRIFT_FLUSH_SECONDS and before reporting
+scores, so /metrics and the slide show the same totals whichever
+gunicorn worker answers.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+
+import flask
+import numpy as np
+
+from app import app
+from utils import FEATURES
+
+N_BINS = int(os.environ.get('DRIFT_BINS', 10))
+# live counts are halved once they reach this total, favouring recent requests
+DRIFT_WINDOW = float(os.environ.get('DRIFT_WINDOW', 5000))
+DRIFT_DIR = os.environ.get('DRIFT_DIR', os.path.join('.cache', 'drift'))
+DRIFT_FLUSH_SECONDS = float(os.environ.get('DRIFT_FLUSH_SECONDS', 5))
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# keeps empty bins from making PSI infinite
+_EPS = 1e-4
+
+
+class DriftMonitor:
+    """
+    Binned training and live histograms of every predictor of one plant.
+
+    New live counts are kept in a per-process delta and merged into the
+    shared file at `path`, which holds the totals of all worker processes
+    together with the training histograms.
+    """
+
+    def __init__(self, Z, path, version=None, n_bins=N_BINS, window=DRIFT_WINDOW):
+        self.path = path
+        self.version = version
+        values = Z[FEATURES].to_numpy(dtype=float)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        # inner edges only, the outer bins are open-ended
+        self.edges = [np.unique(np.nanquantile(values[:, j], quantiles)) for j in range(len(FEATURES))]
+        self.train = [self._histogram(values[:, j], j) for j in range(len(FEATURES))]
+        self.live = [np.zeros(len(e) + 1) for e in self.edges]
+        self.window = window
+        self.samples = 0
+        self._delta = [np.zeros(len(e) + 1) for e in self.edges]
+        self._delta_samples = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _histogram(self, column, j):
+        column = column[~np.isnan(column)]
+        return np.bincount(np.searchsorted(self.edges[j], column, side='right'),
+                           minlength=len(self.edges[j]) + 1).astype(float)
+
+    def record(self, X):
+        """
+        Count scored rows (DataFrame or array with FEATURES columns) into the live bins.
+        """
+        values = np.asarray(X[FEATURES] if hasattr(X, 'columns') else X, dtype=float)
+        with self._lock:
+            for j in range(len(FEATURES)):
+                column = values[:, j]
+                column = column[~np.isnan(column)]
+                np.add.at(self._delta[j], np.searchsorted(self.edges[j], column, side='right'), 1)
+            self._delta_samples += len(values)
+            due = time.monotonic() - self._flushed >= DRIFT_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Merge this process's new counts into the shared totals and reload them.
+        """
+        with self._lock:
+            delta, self._delta = self._delta, [np.zeros_like(d) for d in self._delta]
+            delta_samples, self._delta_samples = self._delta_samples, 0
+            self._flushed = time.monotonic()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            # serializes the read-modify-write between worker processes
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            live, samples = [np.zeros_like(d) for d in delta], 0
+            if os.path.exists(self.path):
+                stored = read_counts(self.path)
+                live, samples = stored['live'], stored['samples']
+            live = [l + d for l, d in zip(live, delta)]
+            samples += delta_samples
+            if live[0].sum() >= self.window:
+                live = [counts * 0.5 for counts in live]
+            if delta_samples or not os.path.exists(self.path):
+                tmp = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump({'train': [counts.tolist() for counts in self.train],
+                               'live': [counts.tolist() for counts in live],
+                               'samples': samples}, f)
+                os.replace(tmp, self.path)
+
+        with self._lock:
+            self.live, self.samples = live, samples
+
+    def scores(self):
+        """
+        PSI and KS statistic of every predictor, live against training distribution.
+        """
+        self.flush()
+        with self._lock:
+            live = [counts.copy() for counts in self.live]
+        return drift_scores(self.train, live)
+
+
+def read_counts(path):
+    with open(path) as f:
+        stored = json.load(f)
+    return {'train': [np.array(counts) for counts in stored['train']],
+            'live': [np.array(counts) for counts in stored['live']],
+            'samples': stored['samples']}
+
+
+def drift_scores(train, live):
+    result = {}
+    for feature, train_counts, counts in zip(FEATURES, train, live):
+        if counts.sum() == 0:
+            result[feature] = {'psi': 0.0, 'ks': 0.0}
+            continue
+        p = np.clip(train_counts / train_counts.sum(), _EPS, None)
+        q = np.clip(counts / counts.sum(), _EPS, None)
+        psi = float(np.sum((q - p) * np.log(q / p)))
+        ks = float(np.max(np.abs(np.cumsum(train_counts) / train_counts.sum() - np.cumsum(counts) / counts.sum())))
+        result[feature] = {'psi': round(psi, 4), 'ks': round(ks, 4)}
+    return result
+
+
+def drift_status(psi):
+    if psi >= PSI_SIGNIFICANT:
+        return 'significant'
+    if psi >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(plant):
+    """
+    Monitor of a plant's current dataset, created from its training data.
+    """
+    with _monitors_lock:
+        monitor = _monitors.get(plant.plant_id)
+        if monitor is None or monitor.version != plant.version:
+            path = os.path.join(DRIFT_DIR, f'{plant.plant_id}-{plant.version}.json')
+            monitor = DriftMonitor(plant.Z, path, plant.version)
+            _monitors[plant.plant_id] = monitor
+        return monitor
+
+
+def record(plant, X):
+    get_monitor(plant).record(X)
+
+
+# -----------------------------------
+# Metrics Route
+# -----------------------------------
+
+@app.server.route('/metrics')
+def metrics():
+    """
+    Drift scores of every monitored plant in Prometheus text format.
+
+    Read from the shared count files, so every worker reports the same totals,
+    also for plants it has not loaded itself.
+    """
+    with _monitors_lock:
+        monitors = list(_monitors.values())
+    for monitor in monitors:
+        monitor.flush()
+
+    # the newest count file of each plant belongs to its current dataset version
+    latest = {}
+    if os.path.isdir(DRIFT_DIR):
+        for name in os.listdir(DRIFT_DIR):
+            if name.endswith('.json'):
+                path = os.path.join(DRIFT_DIR, name)
+                plant_id = name[:-len('.json')].rsplit('-', 1)[0]
+                if plant_id not in latest or os.path.getmtime(path) > os.path.getmtime(latest[plant_id]):
+                    latest[plant_id] = path
+
+    psi = ['# HELP cement_input_psi Population stability index of a predictor, live vs training data.',
+           '# TYPE cement_input_psi gauge']
+    ks = ['# HELP cement_input_ks Kolmogorov-Smirnov statistic of a predictor on the drift bins.',
+          '# TYPE cement_input_ks gauge']
+    samples = ['# HELP cement_input_samples_total Scored samples recorded by the drift monitor.',
+               '# TYPE cement_input_samples_total counter']
+    for plant_id, path in sorted(latest.items()):
+        counts = read_counts(path)
+        for feature, score in drift_scores(counts['train'], counts['live']).items():
+            labels = 'plant="{}",feature="{}"'.format(plant_id, feature.replace('"', '\\"'))
+            psi.append(f'cement_input_psi{{{labels}}} {score["psi"]}')
+            ks.append(f'cement_input_ks{{{labels}}} {score["ks"]}')
+        samples.append(f'cement_input_samples_total{{plant="{plant_id}"}} {counts["samples"]}')
+    lines = psi + ks + samples
+    return flask.Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,175 @@
+"""
+Permutation importance of every model in utils.model_list.
+
+All permutations of a model are stacked into a few large predict calls and
+models are evaluated in parallel. Results are cached per plant and model
+version, so the graph slide only reads them; on a miss it starts the
+computation in a background thread instead of inside the request.
+Precompute with:
+
+    python importance.py [plant_id ...]
+"""
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import r2_score
+
+from registry import DEFAULT_PLANT, get_plant, model_version
+from training import shared_split
+from utils import FEATURES, MODEL_NAMES, predict_horizons
+
+CACHE_DIR = os.environ.get('IMPORTANCE_CACHE_DIR', os.path.join('.cache', 'importance'))
+N_REPEATS = int(os.environ.get('IMPORTANCE_REPEATS', 10))
+# rows per predict call when scoring the stacked permutations
+PREDICT_CHUNK_ROWS = 200_000
+
+_memory = {}
+_lock = threading.Lock()
+# one lock per model version being computed, and the versions computing in the background
+_computing = {}
+_background = set()
+
+
+def _horizon_r2(y, predicted):
+    # mean R² over horizons, each on the rows where it is measured
+    scores = []
+    for k in range(y.shape[1]):
+        measured = ~np.isnan(y[:, k])
+        if measured.sum() > 1:
+            scores.append(r2_score(y[measured, k], predicted[measured, k]))
+    return float(np.mean(scores))
+
+
+def batched_permutation_importance(model, X, y, n_repeats=N_REPEATS, random_state=0):
+    """
+    Permutation importance (drop of R², averaged over measured horizons) of each column of X.
+
+    Every (feature, repeat) permutation of X is stacked into one array and
+    scored in chunks of PREDICT_CHUNK_ROWS instead of one predict per permutation.
+    """
+    columns = list(X.columns) if hasattr(X, 'columns') else None
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float).reshape(len(X), -1)
+    n_rows, n_features = X.shape
+    rng = np.random.RandomState(random_state)
+
+    stacked = np.tile(X, (n_features * n_repeats, 1))
+    for j in range(n_features):
+        for r in range(n_repeats):
+            start = (j * n_repeats + r) * n_rows
+            stacked[start:start + n_rows, j] = X[rng.permutation(n_rows), j]
+
+    predicted = np.concatenate([
+        predict_horizons(model, pd.DataFrame(stacked[i:i + PREDICT_CHUNK_ROWS], columns=columns))
+        for i in range(0, len(stacked), PREDICT_CHUNK_ROWS)
+    ])
+    baseline = _horizon_r2(y, predict_horizons(model, pd.DataFrame(X, columns=columns)))
+    scores = np.array([
+        _horizon_r2(y, block) for block in predicted.reshape(n_features * n_repeats, n_rows, -1)
+    ]).reshape(n_features, n_repeats)
+    drops = baseline - scores
+    return drops.mean(axis=1), drops.std(axis=1)
+
+
+def _cache_path(version):
+    return os.path.join(CACHE_DIR, f'{version}.json')
+
+
+def compute_importance(plant, n_repeats=N_REPEATS, n_jobs=-1):
+    """
+    Compute importances of all models of a plant, in parallel across models.
+    """
+    x_train, x_test, y_train, y_test = shared_split(plant.Z, plant.Y)
+    results = Parallel(n_jobs=min(len(plant.models), os.cpu_count() or 1) if n_jobs == -1 else n_jobs)(
+        delayed(batched_permutation_importance)(model, x_test, y_test, n_repeats)
+        for model in plant.models
+    )
+    return {
+        'features': FEATURES,
+        'models': {
+            name: {'mean': mean.round(4).tolist(), 'std': std.round(4).tolist()}
+            for name, (mean, std) in zip(MODEL_NAMES, results)
+        },
+    }
+
+
+def cached_importance(plant, version=None):
+    """
+    Importances of a plant's models from memory or the cache directory, None if not computed yet.
+    """
+    version = version or model_version(plant)
+    with _lock:
+        if version in _memory:
+            return _memory[version]
+    path = _cache_path(version)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        result = json.load(f)
+    with _lock:
+        _memory[version] = result
+    return result
+
+
+def get_importance(plant):
+    """
+    Cached importances of a plant's models, computed on the first miss.
+
+    Only one computation runs per model version; other versions stay readable meanwhile.
+    """
+    version = model_version(plant)
+    result = cached_importance(plant, version)
+    if result is not None:
+        return result
+
+    with _lock:
+        version_lock = _computing.setdefault(version, threading.Lock())
+    with version_lock:
+        try:
+            result = cached_importance(plant, version)
+            if result is None:
+                result = compute_importance(plant)
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                path = _cache_path(version)
+                tmp = f'{path}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(result, f)
+                os.replace(tmp, path)
+                with _lock:
+                    _memory[version] = result
+        finally:
+            with _lock:
+                _computing.pop(version, None)
+    return result
+
+
+def schedule_importance(plant):
+    """
+    Compute a plant's importances in a background thread, once per model version.
+    """
+    version = model_version(plant)
+    with _lock:
+        if version in _background:
+            return
+        _background.add(version)
+
+    def run():
+        try:
+            get_importance(plant)
+        finally:
+            with _lock:
+                _background.discard(version)
+
+    threading.Thread(target=run, name=f'importance-{version}', daemon=True).start()
+
+
+if __name__ == '__main__':
+    for plant_id in sys.argv[1:] or [DEFAULT_PLANT]:
+        plant = get_plant(stored=plant_id)
+        get_importance(plant)
+        print(f'Cached importance for {model_version(plant)}')
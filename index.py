@@ -3,13 +3,16 @@
 import importlib
 import os
 import sys
+from urllib.parse import parse_qs
 
 from dash import dcc, html  # Updated import for Dash components
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 
 from app import app  # Import the initialized Dash app
+import scoring  # Registers the /api/score routes on the Flask server
 from presentation import slide_order  # Import slide order from your presentation module
+from registry import PLANT_QUERY_PARAM
 
 # -----------------------------------
 # Dynamically Import Slide Modules
@@ -29,6 +32,9 @@ for filename in os.listdir(slides_path):
         else:
             print(f"Module {module_name} already imported")
 
+# WSGI entry point for gunicorn (index:server)
+server = app.server
+
 # -----------------------------------
 # Helper Functions
 # -----------------------------------
@@ -72,6 +78,9 @@ app.layout = html.Div(
                 # URL component to handle page routing
                 dcc.Location(id='url', refresh=False),
 
+                # Plant selected with '?plant=<id>', kept for the browser session
+                dcc.Store(id='plant', storage_type='session'),
+
                 # Navigation Bar
                 dbc.Container(
                     fluid=True,
@@ -215,6 +224,21 @@ def set_slide_state(pathname):
         return '/'
     return pathname.strip('/') if pathname != '/' else '/'
 
+@app.callback(
+    Output('plant', 'data'),
+    [Input('url', 'search')],
+    [State('plant', 'data')]
+)
+def set_plant(search, stored):
+    """
+    Remember the plant given in the URL query so it survives slide navigation.
+    """
+    if search:
+        values = parse_qs(search.lstrip('?')).get(PLANT_QUERY_PARAM)
+        if values:
+            return values[0]
+    return stored
+
 @app.callback(
     Output('slide-count', 'label'),
     [Input('current-slide', 'children')]
@@ -0,0 +1,233 @@
+"""
+Chunked ingestion of raw LIMS exports (Excel or CSV) into a plant dataset.
+
+The export is streamed chunk by chunk: raw column names are mapped to the
+model features and target, missing predictor values are replaced by the
+running mean of the column seen so far, and each chunk is written as one
+parquet partition. Memory use depends on the chunk size only. The summary
+reports how many values of each predictor were imputed and how many rows
+were dropped because a predictor had no value to average yet.
+
+    python ingest.py export.xlsx --plant <plant_id> [--chunk-rows 50000]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from registry import PLANTS_DIR, is_valid_plant_id
+from utils import FEATURES, TARGET, TARGETS
+
+CHUNK_ROWS = 50_000
+
+# Raw export headers seen at the plants, per dataset column.
+# Headers are compared after lowercasing and dropping everything but letters and digits.
+COLUMN_ALIASES = {
+    'R 008, %': ['R 008, %', 'R008', 'residue 008', 'sieve residue 45um', 'R45'],
+    'SO₃, %': ['SO₃, %', 'SO3, %', 'SO3', 'sulphate', 'sulfate'],
+    'additive1, g/t': ['additive1, g/t', 'additive1', 'additive 1', 'quality improver'],
+    'additive2, g/t': ['additive2, g/t', 'additive2', 'additive 2', 'grinding aid'],
+    't, cement, ° С': ['t, cement, ° С', 't, cement, ° C', 'cement temperature', 'mill outlet temperature'],
+    'moisture,%': ['moisture,%', 'moisture', 'H2O'],
+    'Free_lime,%': ['Free_lime,%', 'free lime', 'CaO free', 'fCaO'],
+    'limestone,%': ['limestone,%', 'limestone', 'filler'],
+    'Eq.Na2O,%': ['Eq.Na2O,%', 'Na2O eq', 'Na2Oeq', 'alkali', 'equivalent Na2O'],
+    'C3S%': ['C3S%', 'C3S'],
+    'C3A%': ['C3A%', 'C3A'],
+    'LOI,%': ['LOI,%', 'LOI', 'loss on ignition'],
+    '2 days MPa': ['2 days MPa', '2d MPa', '2 day strength', 'compressive strength 2d', 'CS 2d'],
+    '7 days MPa': ['7 days MPa', '7d MPa', '7 day strength', 'compressive strength 7d', 'CS 7d'],
+    '28 days MPa': ['28 days MPa', '28d MPa', '28 day strength', 'compressive strength 28d', 'CS 28d'],
+}
+
+
+def _normalize(name):
+    return re.sub(r'[^0-9a-z]', '', str(name).replace('₃', '3').lower())
+
+
+def column_mapping(raw_columns, aliases=COLUMN_ALIASES):
+    """
+    Map raw export headers to dataset columns, raising ValueError if a predictor or TARGET is missing.
+    The later strength horizons are mapped when the export has them.
+    """
+    lookup = {_normalize(alias): column for column, names in aliases.items() for alias in names}
+    mapping = {}
+    for raw in raw_columns:
+        column = lookup.get(_normalize(raw))
+        if column is not None and column not in mapping.values():
+            mapping[raw] = column
+    missing = [c for c in FEATURES + [TARGET] if c not in mapping.values()]
+    if missing:
+        raise ValueError(f'export has no column for: {", ".join(missing)}')
+    return mapping
+
+
+# -----------------------------------
+# Readers
+# -----------------------------------
+
+def read_csv_chunks(path, chunk_rows=CHUNK_ROWS, sep=','):
+    yield from pd.read_csv(path, sep=sep, chunksize=chunk_rows, dtype=str)
+
+
+def read_excel_chunks(path, chunk_rows=CHUNK_ROWS, sheet=None):
+    """
+    Stream an Excel sheet in row chunks with openpyxl's read-only mode.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else '' for c in next(rows)]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS, sheet=None, sep=','):
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        return read_excel_chunks(path, chunk_rows, sheet)
+    return read_csv_chunks(path, chunk_rows, sep)
+
+
+# -----------------------------------
+# Cleaning
+# -----------------------------------
+
+class RunningMeanImputer:
+    """
+    Replaces missing predictor values by the mean of all values seen so far.
+
+    Each chunk first updates the per-column sums and counts with its own
+    values, so the first chunk is imputed as well. A row missing a predictor
+    that has had no value yet cannot be imputed and is dropped, so a NaN
+    predictor never reaches the store.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.sums = np.zeros(len(columns))
+        self.counts = np.zeros(len(columns))
+        self.imputed = np.zeros(len(columns), dtype=int)
+        self.dropped = 0
+
+    def transform(self, chunk):
+        values = chunk[self.columns]
+        self.sums += values.sum(skipna=True).to_numpy()
+        self.counts += values.count().to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts
+        missing = values.isna()
+        unknown = missing.loc[:, self.counts == 0].any(axis=1)
+        self.dropped += int(unknown.sum())
+        self.imputed += missing[~unknown].sum().to_numpy()
+        chunk = chunk[~unknown].copy()
+        chunk[self.columns] = values[~unknown].fillna(pd.Series(means, index=self.columns))
+        return chunk
+
+    def report(self):
+        return {'imputed': dict(zip(self.columns, self.imputed.tolist())), 'dropped': self.dropped}
+
+    def means(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return dict(zip(self.columns, (self.sums / self.counts).round(4).tolist()))
+
+
+def _to_float(column):
+    if column.dtype == object:
+        column = column.astype(str).str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(column, errors='coerce')
+
+
+def mapped_targets(mapping):
+    return [t for t in TARGETS if t in mapping.values()]
+
+
+def clean_chunk(chunk, mapping, imputer):
+    chunk = chunk[list(mapping)].rename(columns=mapping)
+    chunk = chunk.apply(_to_float)
+    # rows without a measured strength cannot be used for training,
+    # later horizons may still be pending and are left missing
+    chunk = chunk[chunk[TARGET].notna()].copy()
+    return imputer.transform(chunk)[FEATURES + mapped_targets(mapping)]
+
+
+# -----------------------------------
+# Pipeline
+# -----------------------------------
+
+def ingest(path, plant_id, chunk_rows=CHUNK_ROWS, sheet=None, sep=',', aliases=COLUMN_ALIASES):
+    """
+    Convert an export into PLANTS_DIR/<plant_id>/data.parquet, one partition per chunk.
+
+    The new dataset replaces the previous one only once the whole export
+    has been written.
+    """
+    if not is_valid_plant_id(plant_id):
+        raise ValueError(f'invalid plant id {plant_id!r}')
+    out_dir = os.path.join(PLANTS_DIR, plant_id, 'data.parquet')
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    mapping = None
+    imputer = RunningMeanImputer(FEATURES)
+    schema = None
+    rows = 0
+    part = 0
+    for chunk in read_chunks(path, chunk_rows, sheet, sep):
+        if mapping is None:
+            mapping = column_mapping(chunk.columns, aliases)
+            schema = pa.schema([(c, pa.float64()) for c in FEATURES + mapped_targets(mapping)])
+        chunk = clean_chunk(chunk, mapping, imputer)
+        if chunk.empty:
+            continue
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        pq.write_table(table, os.path.join(tmp_dir, f'part-{part:05d}.parquet'))
+        rows += len(chunk)
+        part += 1
+
+    empty = [c for c, n in zip(FEATURES, imputer.counts) if n == 0]
+    if empty or rows == 0:
+        shutil.rmtree(tmp_dir)
+        if empty:
+            raise ValueError(f'{path} has no values for {", ".join(empty)}')
+        raise ValueError(f'{path} contains no rows with a measured {TARGET}')
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return {'rows': rows, 'partitions': part, 'means': imputer.means(), **imputer.report()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest a raw plant export into the columnar store.')
+    parser.add_argument('path', help='Excel (.xlsx) or CSV export')
+    parser.add_argument('--plant', required=True, help='plant id, the output goes to PLANTS_DIR/<plant>/')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--sheet', help='Excel sheet name, the active sheet by default')
+    parser.add_argument('--sep', default=',', help='CSV field separator')
+    parser.add_argument('--aliases', help='JSON file with extra {column: [raw names]} aliases')
+    args = parser.parse_args()
+
+    aliases = {c: list(names) for c, names in COLUMN_ALIASES.items()}
+    if args.aliases:
+        with open(args.aliases) as f:
+            for column, names in json.load(f).items():
+                aliases.setdefault(column, []).extend(names)
+
+    summary = ingest(args.path, args.plant, args.chunk_rows, args.sheet, args.sep, aliases)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
@@ -0,0 +1,281 @@
+"""
+Load test of the Dash callback endpoints.
+
+Starts the app under gunicorn for each worker configuration, replays
+realistic sessions with concurrent virtual users and reports throughput,
+latency percentiles and the CPU/RSS of the gunicorn workers. Sessions walk
+through slide_order, edit the prediction table and change the dropdowns and
+the correlation checklist, posting the same /_dash-update-component
+payloads as the browser.
+
+    python loadtest.py --users 20 --duration 60 --config sync:4 --config gthread:2x8
+    python loadtest.py --url http://localhost:8052 --users 10
+"""
+import argparse
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import psutil
+import requests
+
+from presentation import slide_order
+from utils import FEATURES, TARGET, MODEL_NAMES
+
+UPDATE_URL = '/_dash-update-component'
+
+
+# -----------------------------------
+# Payloads
+# -----------------------------------
+
+class Callbacks:
+    """
+    Callback specs from /_dash-dependencies, used to build update payloads.
+    """
+
+    def __init__(self, base_url, session):
+        self.specs = session.get(base_url + '/_dash-dependencies', timeout=30).json()
+
+    def find(self, output):
+        for spec in self.specs:
+            if output in spec['output'].strip('.').split('...'):
+                return spec
+        raise KeyError(output)
+
+    def payload(self, output, values, changed):
+        """
+        Body of an update request for the callback writing `output`.
+
+        `values` maps 'id.property' to the current value of every input and
+        state, `changed` lists the 'id.property' that triggered the update.
+        """
+        spec = self.find(output)
+        outputs = [dict(zip(('id', 'property'), o.rsplit('.', 1)))
+                   for o in spec['output'].strip('.').split('...')]
+        return {
+            'output': spec['output'],
+            'outputs': outputs if spec['output'].startswith('..') else outputs[0],
+            'inputs': [dict(i, value=values.get(f"{i['id']}.{i['property']}")) for i in spec['inputs']],
+            'state': [dict(s, value=values.get(f"{s['id']}.{s['property']}")) for s in spec['state']],
+            'changedPropIds': changed,
+        }
+
+
+def session_steps(df, rng):
+    """
+    One user session as a list of (callback output, values, changed props).
+    """
+    steps = []
+    for slide in slide_order:
+        path = '/' + slide
+        steps.append(('page-content.children', {'url.pathname': path}, ['url.pathname']))
+        steps.append(('current-slide.children', {'url.pathname': path}, ['url.pathname']))
+        steps.append(('next-link.href', {'current-slide.children': slide, 'url.pathname': path},
+                      ['current-slide.children']))
+
+        if slide == 'table':
+            continue
+        if slide == 'graph':
+            for _ in range(3):
+                steps.append(('indicator-graphic.figure',
+                              {'xaxis-column.value': rng.choice(FEATURES), 'yaxis-column.value': TARGET},
+                              ['xaxis-column.value']))
+            columns = list(df.columns)
+            for _ in range(3):
+                chosen = sorted(rng.sample(columns, rng.randint(2, len(columns))), key=columns.index)
+                steps.append(('graph.figure',
+                              {'corrvalues.value': chosen, 'heatmap-order.value': rng.choice(['dataset', 'cluster'])},
+                              ['corrvalues.value']))
+        if slide == 'stat':
+            for model in rng.sample(MODEL_NAMES, 3):
+                steps.append(('so3optimization.figure', {'models.value': model}, ['models.value']))
+        if slide == 'content':
+            columns = [{'id': c, 'name': c} for c in FEATURES]
+            for _ in range(5):
+                row = df[FEATURES].iloc[rng.randrange(len(df))].to_dict()
+                row['SO₃, %'] = round(row['SO₃, %'] + rng.uniform(-0.3, 0.3), 2)
+                steps.append(('ridge.children',
+                              {'table-editing-simple.data': [row], 'table-editing-simple.columns': columns},
+                              ['table-editing-simple.data']))
+    return steps
+
+
+# -----------------------------------
+# Load Generation
+# -----------------------------------
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, output, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(output, []).append(seconds)
+            if not ok:
+                self.errors += 1
+
+
+def virtual_user(base_url, callbacks, df, deadline, results, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        for output, values, changed in session_steps(df, rng):
+            if time.monotonic() >= deadline:
+                return
+            body = callbacks.payload(output, values, changed)
+            start = time.perf_counter()
+            try:
+                ok = session.post(base_url + UPDATE_URL, json=body, timeout=60).status_code in (200, 204)
+            except requests.RequestException:
+                ok = False
+            results.add(output, time.perf_counter() - start, ok)
+
+
+def sample_workers(master_pid, stop, samples):
+    """
+    Sample CPU % and RSS (MB) summed over the gunicorn workers every second.
+    """
+    master = psutil.Process(master_pid)
+    # cpu_percent measures since the previous call on the same Process object
+    workers = {}
+    while not stop.wait(1):
+        try:
+            for child in master.children(recursive=True):
+                if child.pid not in workers:
+                    workers[child.pid] = child
+                    child.cpu_percent()
+            alive = [w for w in workers.values() if w.is_running()]
+            cpu = sum(w.cpu_percent() for w in alive)
+            rss = sum(w.memory_info().rss for w in alive) / 2 ** 20
+        except psutil.Error:
+            continue
+        samples.append((cpu, rss))
+
+
+def run_load(base_url, users, duration, master_pid=None):
+    df = pd.read_csv('data.csv', sep=',').drop(columns=['Unnamed: 0'], errors='ignore')
+    callbacks = Callbacks(base_url, requests.Session())
+    results = Results()
+    stop = threading.Event()
+    samples = []
+    sampler = None
+    if master_pid is not None:
+        sampler = threading.Thread(target=sample_workers, args=(master_pid, stop, samples), daemon=True)
+        sampler.start()
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        futures = [pool.submit(virtual_user, base_url, callbacks, df, start + duration, results, user)
+                   for user in range(users)]
+        for future in futures:
+            future.result()
+    elapsed = time.monotonic() - start
+    stop.set()
+    if sampler is not None:
+        sampler.join()
+    return summarize(results, elapsed, samples)
+
+
+def summarize(results, elapsed, samples):
+    all_latencies = np.array([s for v in results.latencies.values() for s in v]) * 1000
+    summary = {
+        'requests': len(all_latencies),
+        'errors': results.errors,
+        'req/s': round(len(all_latencies) / elapsed, 1),
+    }
+    # no percentiles when every request failed before a response was timed
+    if len(all_latencies):
+        summary.update({'p50 ms': round(float(np.percentile(all_latencies, 50)), 1),
+                        'p90 ms': round(float(np.percentile(all_latencies, 90)), 1),
+                        'p99 ms': round(float(np.percentile(all_latencies, 99)), 1)})
+    if samples:
+        cpu, rss = np.array(samples).T
+        summary.update({'cpu % avg': round(float(cpu.mean()), 1), 'cpu % max': round(float(cpu.max()), 1),
+                        'rss MB max': round(float(rss.max()), 1)})
+    per_callback = pd.DataFrame([
+        {'callback': output.strip('.').split('.')[0], 'requests': len(v),
+         'p50 ms': round(float(np.percentile(v, 50)) * 1000, 1),
+         'p99 ms': round(float(np.percentile(v, 99)) * 1000, 1)}
+        for output, v in results.latencies.items()
+    ], columns=['callback', 'requests', 'p50 ms', 'p99 ms'])
+    return summary, per_callback
+
+
+# -----------------------------------
+# Server Configurations
+# -----------------------------------
+
+def parse_config(text):
+    """
+    'sync:4' -> 4 sync workers, 'gthread:2x8' -> 2 gthread workers with 8 threads each.
+    """
+    worker_class, _, size = text.partition(':')
+    workers, _, threads = (size or '1').partition('x')
+    return worker_class, int(workers), int(threads or 1)
+
+
+def start_server(worker_class, workers, threads, port):
+    command = [sys.executable, '-m', 'gunicorn', 'index:server', '--bind', f'127.0.0.1:{port}',
+               '--worker-class', worker_class, '--workers', str(workers), '--threads', str(threads),
+               '--timeout', '120']
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+        try:
+            requests.get(base_url + '/_dash-layout', timeout=5)
+            return server, base_url
+        except requests.RequestException:
+            time.sleep(1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def warm_up(base_url, users):
+    # the first requests of every worker fit the models of the default plant
+    run_load(base_url, users, duration=10)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the Dash callback endpoints.')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per configuration')
+    parser.add_argument('--config', action='append',
+                        help="gunicorn worker setting 'class:workers[xthreads]', repeat to compare")
+    parser.add_argument('--url', help='test an already running server instead of starting gunicorn')
+    parser.add_argument('--port', type=int, default=8061)
+    args = parser.parse_args()
+
+    if args.url:
+        summary, per_callback = run_load(args.url.rstrip('/'), args.users, args.duration)
+        print(pd.DataFrame([summary]).to_string(index=False))
+        print(per_callback.to_string(index=False))
+        sys.exit(0)
+
+    rows = []
+    for config in args.config or ['sync:2', 'gthread:2x8']:
+        worker_class, workers, threads = parse_config(config)
+        server, base_url = start_server(worker_class, workers, threads, args.port)
+        try:
+            warm_up(base_url, workers * threads)
+            summary, per_callback = run_load(base_url, args.users, args.duration, server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        print(f'\n{config}')
+        print(per_callback.to_string(index=False))
+        rows.append({'config': config, **summary})
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
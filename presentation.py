@@ -10,6 +10,8 @@ slide_order = [
     'graph',
     'stat',
     'content',
+    'sensitivity',
+    'monitoring',
     'reference'
 ]
 
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+import flask
+import pandas as pd
+
+from utils import FEATURES, TARGET, dataset_targets, dataset_y, model_list
+
+# -----------------------------------
+# Configuration
+# -----------------------------------
+
+# Each plant lives in PLANTS_DIR/<plant_id>/ with either a data.parquet
+# directory written by ingest.py or a hand-prepared data.csv.
+# Without either, the default plant uses the data.csv at the repository root.
+PLANTS_DIR = os.environ.get('PLANTS_DIR', 'plants')
+DEFAULT_PLANT = os.environ.get('DEFAULT_PLANT', 'default')
+DEFAULT_DATA = 'data.csv'
+DATA_FILES = ['data.parquet', 'data.csv']
+
+# Bounds on what a single worker keeps resident
+MAX_RESIDENT_PLANTS = int(os.environ.get('MAX_RESIDENT_PLANTS', 8))
+MEMORY_BUDGET_MB = float(os.environ.get('PLANT_MEMORY_BUDGET_MB', 512))
+
+# Plant selection: '?plant=<id>' in the page URL or this request header
+PLANT_QUERY_PARAM = 'plant'
+PLANT_HEADER = 'X-Plant-Id'
+
+_valid_plant_id = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+# -----------------------------------
+# Plant Model Set
+# -----------------------------------
+
+class Plant:
+    """
+    Dataset and fitted model set of a single plant.
+    """
+
+    def __init__(self, plant_id, path, df, models, stamp=None):
+        self.plant_id = plant_id
+        self.path = path
+        self.stamp = stamp or dataset_stamp(path)
+        self.df = df
+        self.targets = dataset_targets(df)
+        self.Z = df[FEATURES]
+        self.Y = dataset_y(df)
+        self.models = models
+        self.version = dataset_version(path)
+        self.nbytes = int(df.memory_usage(deep=True).sum()) + len(pickle.dumps(models))
+
+
+def is_valid_plant_id(plant_id):
+    return bool(_valid_plant_id.match(plant_id or ''))
+
+
+def plant_data_path(plant_id):
+    """
+    Return the dataset path of a plant, raising KeyError for unknown plants.
+    """
+    if not is_valid_plant_id(plant_id):
+        raise KeyError(plant_id)
+    for name in DATA_FILES:
+        path = os.path.join(PLANTS_DIR, plant_id, name)
+        if os.path.exists(path):
+            return path
+    if plant_id == DEFAULT_PLANT:
+        return DEFAULT_DATA
+    raise KeyError(plant_id)
+
+
+def dataset_version(path):
+    """
+    Short content hash of a dataset, used to key caches built from its models.
+    """
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    for file in files:
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def dataset_stamp(path):
+    """
+    Cheap change marker of a dataset: path, size and mtime of each of its files.
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    stats = [os.stat(file) for file in files]
+    return (path,) + tuple((file, st.st_size, st.st_mtime_ns) for file, st in zip(files, stats))
+
+
+def read_dataset(path):
+    """
+    Read a plant dataset from a partitioned parquet directory or a csv file.
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, sep=',')
+
+
+def model_version(plant):
+    """
+    Key identifying a plant's fitted model set: dataset hash plus hyperparameters.
+    """
+    params = repr([sorted(m.get_params().items()) for m in plant.models])
+    return f'{plant.plant_id}-{plant.version}-{hashlib.sha1(params.encode()).hexdigest()[:8]}'
+
+
+def load_plant(plant_id):
+    """
+    Read a plant's dataset and fit its model set.
+    """
+    path = plant_data_path(plant_id)
+    # taken before reading, so a dataset replaced meanwhile is picked up on the next request
+    stamp = dataset_stamp(path)
+    df = read_dataset(path)
+    # later horizons may still be pending, each horizon's models use the rows where it is measured
+    df = df.dropna(subset=[TARGET]).reset_index(drop=True)
+    models = model_list(df[FEATURES], dataset_y(df))
+    return Plant(plant_id, path, df, models, stamp)
+
+
+# -----------------------------------
+# Registry
+# -----------------------------------
+
+class PlantRegistry:
+    """
+    Lazily loads plants and keeps the most recently used ones resident.
+
+    At most `max_plants` plants are kept, and least recently used plants are
+    evicted while the resident set exceeds `budget_mb`. The plant being
+    requested is never evicted, even if it alone is above the budget.
+    A resident plant whose dataset files have changed since it was loaded,
+    e.g. after ingest.py replaced them, is reloaded on its next request.
+    """
+
+    def __init__(self, max_plants=MAX_RESIDENT_PLANTS, budget_mb=MEMORY_BUDGET_MB, loader=load_plant):
+        self.max_plants = max_plants
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.loader = loader
+        self._plants = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, plant_id=DEFAULT_PLANT):
+        with self._lock:
+            plant = self._plants.get(plant_id)
+        stamp = self._current_stamp(plant_id, plant)
+        with self._lock:
+            plant = self._plants.get(plant_id)
+            if plant is not None and plant.stamp == stamp:
+                self._plants.move_to_end(plant_id)
+                return plant
+            load_lock = self._loading.setdefault(plant_id, threading.Lock())
+
+        # Fit outside the registry lock so other plants stay servable,
+        # and only once per plant when concurrent requests miss together.
+        with load_lock:
+            try:
+                with self._lock:
+                    plant = self._plants.get(plant_id)
+                if plant is None or plant.stamp != stamp:
+                    plant = self.loader(plant_id)
+                    with self._lock:
+                        self._plants[plant_id] = plant
+                        self._evict()
+            finally:
+                # also on failed loads, so unknown plant ids leave nothing behind
+                with self._lock:
+                    self._loading.pop(plant_id, None)
+        return plant
+
+    def _current_stamp(self, plant_id, plant):
+        try:
+            return dataset_stamp(plant_data_path(plant_id))
+        except (KeyError, FileNotFoundError):
+            # ingest.py swaps the parquet directory in two steps, keep serving the
+            # resident plant meanwhile; unknown plants raise KeyError as before
+            if plant is None:
+                raise KeyError(plant_id)
+            return plant.stamp
+
+    def _evict(self):
+        while len(self._plants) > 1 and (
+                len(self._plants) > self.max_plants or self.resident_bytes() > self.budget_bytes):
+            self._plants.popitem(last=False)
+
+    def resident_bytes(self):
+        return sum(p.nbytes for p in self._plants.values())
+
+
+registry = PlantRegistry()
+
+
+def resolve_plant_id(search=None, stored=None):
+    """
+    Pick the plant for the current request.
+
+    The '?plant=' query of the page URL wins, then a plant remembered for the
+    browser session, then the X-Plant-Id header, then the default plant.
+    """
+    if search:
+        values = parse_qs(search.lstrip('?')).get(PLANT_QUERY_PARAM)
+        if values:
+            return values[0]
+    if stored:
+        return stored
+    if flask.has_request_context():
+        header = flask.request.headers.get(PLANT_HEADER)
+        if header:
+            return header
+    return DEFAULT_PLANT
+
+
+def get_plant(search=None, stored=None):
+    return registry.get(resolve_plant_id(search, stored))
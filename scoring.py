@@ -0,0 +1,239 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import flask
+import numpy as np
+import pandas as pd
+
+from app import app
+from registry import get_plant, resolve_plant_id
+from utils import FEATURES, MODEL_NAMES, predict_horizons
+import drift
+
+# -----------------------------------
+# Configuration
+# -----------------------------------
+
+# Requests arriving within BATCH_WINDOW_MS of each other are scored together
+BATCH_WINDOW_MS = float(os.environ.get('SCORING_BATCH_WINDOW_MS', 5))
+MAX_BATCH_ROWS = int(os.environ.get('SCORING_MAX_BATCH_ROWS', 1024))
+# Pending requests beyond MAX_QUEUE are rejected with 503
+MAX_QUEUE = int(os.environ.get('SCORING_MAX_QUEUE', 256))
+PREDICT_THREADS = int(os.environ.get('SCORING_PREDICT_THREADS', 2))
+REQUEST_TIMEOUT = float(os.environ.get('SCORING_TIMEOUT_S', 10))
+
+
+class Overloaded(Exception):
+    """
+    Raised when the scoring queue is full.
+    """
+
+
+class _Pending:
+    __slots__ = ('plant', 'frame', 'future')
+
+    def __init__(self, plant, frame):
+        self.plant = plant
+        self.frame = frame
+        self.future = Future()
+
+
+# -----------------------------------
+# Micro-batching
+# -----------------------------------
+
+class MicroBatcher:
+    """
+    Collects concurrent scoring requests into one vectorized predict per model.
+
+    A dispatcher thread waits for the first pending request, gathers whatever
+    else arrives within the batch window, groups the rows by plant and hands
+    each group to a bounded predict executor. At most `threads` groups are in
+    flight; while all are busy the dispatcher stops draining the queue, so a
+    sustained overload fills it and new requests are rejected.
+    """
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_rows=MAX_BATCH_ROWS,
+                 max_queue=MAX_QUEUE, threads=PREDICT_THREADS):
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self.max_queue = max_queue
+        self.threads = threads
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor = None
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads are started lazily so each forked gunicorn worker gets its own
+        if self._dispatcher is not None and self._dispatcher.is_alive():
+            return
+        with self._start_lock:
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._executor = ThreadPoolExecutor(max_workers=self.threads,
+                                                    thread_name_prefix='scoring')
+                self._dispatcher = threading.Thread(target=self._dispatch, name='scoring-dispatch',
+                                                    daemon=True)
+                self._dispatcher.start()
+
+    def submit(self, plant, frame):
+        """
+        Queue rows for scoring with a loaded plant and return a Future of {model name: predictions}.
+        """
+        self._ensure_started()
+        pending = _Pending(plant, frame)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise Overloaded()
+        return pending.future
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def _dispatch(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0].frame)
+            deadline = time.monotonic() + self.window
+            while rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                rows += len(pending.frame)
+
+            groups = {}
+            for pending in batch:
+                # requests that already timed out are not scored
+                if not pending.future.cancelled():
+                    groups.setdefault(id(pending.plant), []).append(pending)
+            for group in groups.values():
+                self._slots.acquire()
+                with self._in_flight_lock:
+                    self._in_flight += 1
+                self._executor.submit(self._run, group)
+
+    def _run(self, group):
+        try:
+            _score_group(group)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+
+def _score_group(group):
+    # skips requests cancelled after a timeout while waiting for a free slot
+    group = [p for p in group if p.future.set_running_or_notify_cancel()]
+    if not group:
+        return
+    plant = group[0].plant
+    try:
+        X = pd.concat([p.frame for p in group], ignore_index=True)
+        predictions = {name: predict_horizons(model, X) for name, model in zip(MODEL_NAMES, plant.models)}
+        drift.record(plant, X)
+    except Exception as e:
+        for pending in group:
+            pending.future.set_exception(e)
+        return
+
+    bounds = np.cumsum([0] + [len(p.frame) for p in group])
+    for pending, start, stop in zip(group, bounds[:-1], bounds[1:]):
+        pending.future.set_result({
+            name: {target: values[start:stop, k] for k, target in enumerate(plant.targets)}
+            for name, values in predictions.items()
+        })
+
+
+batcher = MicroBatcher()
+
+
+# -----------------------------------
+# HTTP API
+# -----------------------------------
+
+api = flask.Blueprint('scoring', __name__, url_prefix='/api')
+
+
+@api.route('/score', methods=['POST'])
+def score():
+    """
+    Score one or more samples with every model of the selected plant.
+    Predictions are returned per model and per strength horizon.
+
+    Body: {"rows": [{feature: value, ...}, ...]} or a single feature mapping.
+    The plant is taken from '?plant=<id>' or the X-Plant-Id header.
+    """
+    payload = flask.request.get_json(silent=True)
+    if isinstance(payload, dict):
+        rows = payload.get('rows', [payload])
+    else:
+        rows = payload
+    if not isinstance(rows, list) or not rows:
+        return flask.jsonify(error='expected a JSON object or a list of rows'), 400
+
+    try:
+        frame = pd.DataFrame(rows)
+        missing = [c for c in FEATURES if c not in frame.columns]
+        if missing:
+            return flask.jsonify(error='missing features', missing=missing), 400
+        frame = frame[FEATURES].astype('float')
+    except (TypeError, ValueError) as e:
+        return flask.jsonify(error=str(e)), 400
+    # a null or infinite value would make predict fail for every request in the batch
+    invalid = np.flatnonzero(~np.isfinite(frame.to_numpy()).all(axis=1))
+    if len(invalid):
+        return flask.jsonify(error='rows with missing or non-finite values', rows=invalid.tolist()), 400
+
+    plant_id = resolve_plant_id(flask.request.query_string.decode())
+    try:
+        # loaded in the request thread, so a first request fitting a plant's models
+        # neither occupies a predict slot nor counts against REQUEST_TIMEOUT
+        plant = get_plant(stored=plant_id)
+    except KeyError:
+        return flask.jsonify(error=f'unknown plant {plant_id}'), 404
+    try:
+        future = batcher.submit(plant, frame)
+    except Overloaded:
+        response = flask.jsonify(error='scoring queue is full, retry later')
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    try:
+        result = future.result(timeout=REQUEST_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()
+        return flask.jsonify(error='scoring timed out'), 504
+    except Exception as e:
+        return flask.jsonify(error=f'scoring failed: {e}'), 500
+
+    return flask.jsonify(
+        plant=plant_id,
+        predictions={
+            name: {target: [round(float(v), 2) for v in values] for target, values in horizons.items()}
+            for name, horizons in result.items()
+        },
+    )
+
+
+@api.route('/score/health')
+def health():
+    return flask.jsonify(queue_depth=batcher.depth(), max_queue=batcher.max_queue,
+                         in_flight=batcher.in_flight(), max_in_flight=batcher.threads)
+
+
+app.server.register_blueprint(api)
@@ -4,20 +4,15 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
-from utils import model_list
+from dash.dependencies import Input, Output, State
+from utils import FEATURES, TARGET_LABELS, predict_horizons
+from registry import get_plant
+import drift
 import pandas as pd
 
 
 
 
-df1 = pd.read_csv('data.csv', sep = ',')
-Z1 =df1[['R 008, %','SO₃, %', 'additive1, g/t', 'additive2, g/t', 't, cement, ° С',
-         'moisture,%', 'Free_lime,%','limestone,%', 'Eq.Na2O,%', 'C3S%', 'C3A%', 'LOI,%']]
-Y = df1['2 days MPa']
-
-
-
 content = html.Div(style=dict(textAlign='center', border='4px'),children=[
     html.H2(id='intro-div'),
     html.Br(),html.Hr([], className = "divider py-0.5 bg-primary"),
@@ -25,8 +20,8 @@ content = html.Div(style=dict(textAlign='center', border='4px'),children=[
                        compressive strength')], className ='py-2'),
     html.Div([html.H6('Enter parameters to get prediction : ')], className ="row ml-2"),
     html.Div([ dash_table.DataTable( id='table-editing-simple',
-               data= Z1.head(1).to_dict('records'), columns=[{'id': p, 'name': p}
-               for p in list(Z1.columns)], editable=True,
+               data=[], columns=[{'id': p, 'name': p}
+               for p in FEATURES], editable=True,
               style_header={ "backgroundColor": "#1E90FF",
                              "color": "white",'textAlign': 'center',"width": "70px"},
               fixed_rows={"headers": True},style_cell={"width": "90px",
@@ -35,7 +30,7 @@ content = html.Div(style=dict(textAlign='center', border='4px'),children=[
              ]),
     html.Div([html.Output(id='danger', style={'width': '20%', 'height': 8,
                              'font-size':15, 'margin-bottom':0, 'color': 'red' })]),
-    html.Div([html.H6("Output, 2d predicted MPa:")], className ="row mb-3 ml-2"),
+    html.Div([html.H6("Output, predicted MPa (2d, and 7d, 28d when the dataset has them):")], className ="row mb-3 ml-2"),
     html.Div([
     html.Div([
             dbc.Row([
@@ -95,6 +90,19 @@ html.Div(
 ])
 
 
+@app.callback(
+    Output('table-editing-simple', 'data'),
+    Input('url', 'search'),
+    State('plant', 'data'))
+
+def seed_table(search, plant_id):
+    # the first sample of the selected plant's dataset, as a starting point for editing
+    try:
+        return get_plant(search, plant_id).Z.head(1).to_dict('records')
+    except KeyError:
+        return []
+
+
 @app.callback(
     Output ('ridge', 'children'),
     Output ('booster', 'children'),
@@ -103,10 +111,19 @@ html.Div(
     Output ('destree', 'children'),
     Output('danger', 'children'),
     Input('table-editing-simple', 'data'),
-    Input('table-editing-simple', 'columns'))
-
-def display_output(rows, columns):
-
+    Input('table-editing-simple', 'columns'),
+    State('url', 'search'),
+    State('plant', 'data'))
+
+def display_output(rows, columns, search, plant_id):
+
+    try:
+        plant = get_plant(search, plant_id)
+    except KeyError:
+        return  0, 0, 0, 0, 0, 'unknown plant, no prediction available'
+    if not rows:
+        # filled by seed_table once the plant is known
+        return  '', '', '', '', '', ''
     model_demonstration = pd.DataFrame(rows, columns=[c['name'] for c in columns])
     model_demonstration = model_demonstration.astype('float')
     if  model_demonstration['R 008, %'][0] >4 or  model_demonstration['SO₃, %'][0] >4\
@@ -127,10 +144,20 @@ def display_output(rows, columns):
         return  0, 0, 0, 0, 0, danger
 
     else :
+        models = plant.models
+        drift.record(plant, model_demonstration)
         danger =''
-        ridge = round(model_list(Z1, Y)[0].predict(model_demonstration).item(0),2)
-        booster = round(model_list(Z1, Y)[1].predict(model_demonstration).item(0),2)
-        huber = round(model_list(Z1, Y)[2].predict(model_demonstration).item(0),2)
-        lasso = round(model_list(Z1, Y)[3].predict(model_demonstration).item(0),2)
-        polinomal = round(model_list(Z1, Y)[4].predict(model_demonstration).item(0),2)
+        ridge = horizons_output(models[0], model_demonstration, plant.targets)
+        booster = horizons_output(models[1], model_demonstration, plant.targets)
+        huber = horizons_output(models[2], model_demonstration, plant.targets)
+        lasso = horizons_output(models[3], model_demonstration, plant.targets)
+        polinomal = horizons_output(models[4], model_demonstration, plant.targets)
         return ridge, booster, huber, lasso, polinomal, danger
+
+
+def horizons_output(model, sample, targets):
+    # one predict call returns every horizon the model was trained on
+    predicted = predict_horizons(model, sample)[0].round(2)
+    if len(targets) == 1:
+        return predicted[0]
+    return ' | '.join(f'{TARGET_LABELS[t]}: {v}' for t, v in zip(targets, predicted))
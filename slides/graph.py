@@ -1,16 +1,25 @@
+import threading
+
 import pandas as pd
 from app import app
 import dash_core_components as dcc
 import dash_html_components as html
 import plotly.express as px
 import dash_bootstrap_components as dbc
-import plotly.figure_factory as ff
-from dash.dependencies import Input, Output
+import plotly.graph_objs as go
+from scipy.cluster.hierarchy import leaves_list, linkage, optimal_leaf_ordering
+from scipy.spatial.distance import squareform
+from dash.dependencies import Input, Output, State
+from registry import get_plant
+from importance import cached_importance, schedule_importance
+
+# cell values are only written on the heatmap up to this many columns
+MAX_LABELLED_COLUMNS = 20
+# correlation matrices and cluster orders of this many plant dataset versions are kept
+CORRELATION_CACHE_SIZE = 16
 
-# Load data
-df = pd.read_csv('data.csv', sep=',')
-df.rename(columns={'Unnamed: 0': 'sample №'}, inplace=True)
-available_indicators = df.columns
+_correlations = {}
+_correlations_lock = threading.Lock()
 
 # Layout
 content = html.Div(
@@ -43,7 +52,6 @@ content = html.Div(
                 html.Div(
                     dcc.Dropdown(
                         id='xaxis-column',
-                        options=[{'label': i, 'value': i} for i in available_indicators],
                         value='SO₃, %'
                     )
                 ), width={"size": 3, "order": "last", "offset": 12}
@@ -52,7 +60,6 @@ content = html.Div(
                 html.Div(
                     dcc.Dropdown(
                         id='yaxis-column',
-                        options=[{'label': i, 'value': i} for i in available_indicators],
                         value='2 days MPa'
                     )
                 ), width={"size": 3, "order": "first", "offset": 3}
@@ -70,10 +77,15 @@ content = html.Div(
 
         # Checklist and graph container with horizontal alignment for checklist
         html.Div([
+            dcc.RadioItems(
+                id='heatmap-order',
+                options=[{'label': 'dataset order', 'value': 'dataset'},
+                         {'label': 'group correlated parameters', 'value': 'cluster'}],
+                value='dataset',
+                labelStyle={'display': 'inline-block', 'margin-right': '20px'}
+            ),
             dcc.Checklist(
                 id='corrvalues',
-                options=[{'label': x, 'value': x} for x in df.columns],
-                value=df.columns.tolist(),
                 labelStyle={
                     'display': 'inline-block',  # Ensures items are horizontal
                     'margin-right': '20px',  # Adds spacing between items
@@ -81,18 +93,66 @@ content = html.Div(
                 }
             ),
             dcc.Graph(id="graph")
-        ], style={'padding': '10px', 'textAlign': 'left'})
+        ], style={'padding': '10px', 'textAlign': 'left'}),
+
+        html.Div([html.H6('Model-based feature importance')], className='row py-2 mx-auto'),
+
+        html.Div([
+            dbc.Card(
+                dbc.CardBody([
+                    html.P(
+                        "Permutation importance shows how much the accuracy (R²) of each model drops on the test samples when the values of one predictor are randomly shuffled. Unlike the correlation coefficient it also captures non-linear effects and interactions as seen by the trained model.",
+                        style=dict(textAlign="left")
+                    )
+                ])
+            )
+        ]),
+
+        html.Div([html.Output(id='importance-status')]),
+        dcc.Graph(id='importance-graph'),
+        # polls the cache until a background computation has finished
+        dcc.Interval(id='importance-interval', interval=15 * 1000)
     ]
 )
 
 
+def plant_frame(plant):
+    return plant.df.rename(columns={'Unnamed: 0': 'sample №'})
+
+
+# Parameter choices of the selected plant's dataset
+@app.callback(
+    Output('xaxis-column', 'options'),
+    Output('yaxis-column', 'options'),
+    Output('corrvalues', 'options'),
+    Output('corrvalues', 'value'),
+    Input('url', 'search'),
+    State('plant', 'data')
+)
+def plant_columns(search, plant_id):
+    try:
+        columns = plant_frame(get_plant(search, plant_id)).columns.tolist()
+    except KeyError:
+        return [], [], [], []
+    options = [{'label': c, 'value': c} for c in columns]
+    return options, options, options, columns
+
+
 # Callback for scatter plot
 @app.callback(
     Output('indicator-graphic', 'figure'),
     Input('xaxis-column', 'value'),
-    Input('yaxis-column', 'value')
+    Input('yaxis-column', 'value'),
+    State('url', 'search'),
+    State('plant', 'data')
 )
-def update_graph(xaxis_column_name, yaxis_column_name):
+def update_graph(xaxis_column_name, yaxis_column_name, search, plant_id):
+    try:
+        df = plant_frame(get_plant(search, plant_id))
+    except KeyError:
+        return go.Figure()
+    if xaxis_column_name not in df.columns or yaxis_column_name not in df.columns:
+        return go.Figure()
     corr = round(df[xaxis_column_name].corr(df[yaxis_column_name]), 3)
     fig = px.scatter(df, x=xaxis_column_name, y=yaxis_column_name, trendline="lowess", color=yaxis_column_name)
     fig.update_layout(margin={'l': 40, 'b': 40, 't': 10, 'r': 0}, hovermode='closest')
@@ -106,12 +166,93 @@ def update_graph(xaxis_column_name, yaxis_column_name):
     return fig
 
 
+def correlations(plant):
+    """
+    Correlation matrix and cluster orders of a plant's dataset version, computed once.
+    """
+    key = (plant.plant_id, plant.version)
+    with _correlations_lock:
+        entry = _correlations.get(key)
+    if entry is None:
+        # pairwise correlations do not depend on which other columns are selected
+        entry = {'matrix': plant_frame(plant).corr(), 'orders': {}}
+        with _correlations_lock:
+            entry = _correlations.setdefault(key, entry)
+            while len(_correlations) > CORRELATION_CACHE_SIZE:
+                _correlations.pop(next(iter(_correlations)))
+    return entry
+
+
+def cluster_order(entry, cols):
+    """
+    Order columns so that strongly correlated parameters sit next to each other.
+    """
+    if len(cols) < 3:
+        return cols
+    if cols not in entry['orders']:
+        distance = 1 - entry['matrix'].loc[list(cols), list(cols)].abs().fillna(0).values
+        condensed = squareform(distance.clip(0), checks=False)
+        tree = optimal_leaf_ordering(linkage(condensed, method='average'), condensed)
+        entry['orders'][cols] = tuple(cols[i] for i in leaves_list(tree))
+    return entry['orders'][cols]
+
+
 # Callback for correlation heatmap
 @app.callback(
     Output("graph", "figure"),
-    Input("corrvalues", "value")
+    Input("corrvalues", "value"),
+    Input("heatmap-order", "value"),
+    State('url', 'search'),
+    State('plant', 'data')
 )
-def filter_heatmap(cols):
-    z = round(df[cols].corr(), 2)
-    fig = ff.create_annotated_heatmap(z.values, x=z.columns.to_list(), y=z.index.to_list(), colorscale='Viridis')
+def filter_heatmap(cols, order, search, plant_id):
+    try:
+        entry = correlations(get_plant(search, plant_id))
+    except KeyError:
+        return go.Figure()
+    matrix = entry['matrix']
+    cols = [c for c in matrix.columns if c in (cols or [])]
+    if order == 'cluster':
+        cols = list(cluster_order(entry, tuple(cols)))
+    z = matrix.loc[cols, cols].round(2)
+    labelled = len(cols) <= MAX_LABELLED_COLUMNS
+    fig = go.Figure(go.Heatmap(
+        z=z.values, x=cols, y=cols, colorscale='Viridis', zmin=-1, zmax=1,
+        texttemplate='%{z}' if labelled else None,
+        hovertemplate='%{y} / %{x}: %{z}<extra></extra>'
+    ))
+    fig.update_yaxes(autorange='reversed')
+    fig.update_layout(margin={'l': 40, 'b': 40, 't': 10, 'r': 0}, height=max(450, 18 * len(cols)))
     return fig
+
+
+# Callback for permutation importance, read from the per-model-version cache
+@app.callback(
+    Output('importance-graph', 'figure'),
+    Output('importance-status', 'children'),
+    Output('importance-interval', 'disabled'),
+    Input('url', 'search'),
+    Input('importance-interval', 'n_intervals'),
+    State('plant', 'data')
+)
+def importance_graph(search, n, plant_id):
+    try:
+        plant = get_plant(search, plant_id)
+    except KeyError:
+        return go.Figure(), 'unknown plant, no feature importance available', True
+    importance = cached_importance(plant)
+    if importance is None:
+        # never computed inside the request, the interval picks the result up later
+        schedule_importance(plant)
+        return go.Figure(), 'feature importance is being computed, it will appear here shortly', False
+    rows = [
+        {'model': name, 'feature': feature, 'importance': mean, 'std': std}
+        for name, values in importance['models'].items()
+        for feature, mean, std in zip(importance['features'], values['mean'], values['std'])
+    ]
+    fig = px.bar(pd.DataFrame(rows), x='importance', y='feature', color='model', error_x='std',
+                 barmode='group', orientation='h', height=700)
+    fig.update_layout(margin={'l': 40, 'b': 40, 't': 10, 'r': 0})
+    fig.update_xaxes(title='decrease of R² when shuffled')
+    fig.update_yaxes(title='')
+    return fig, '', True
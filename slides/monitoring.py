@@ -0,0 +1,69 @@
+from app import app
+
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_table
+import dash_bootstrap_components as dbc
+from dash.dependencies import Input, Output, State
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objs as go
+from registry import get_plant
+from drift import get_monitor, drift_status, PSI_MODERATE, PSI_SIGNIFICANT
+
+
+content = html.Div(style=dict(textAlign='center', border='1px'), children=[
+
+    html.H2(id='intro-div'),
+    html.Br(), html.Hr([], className="divider py-0.5 bg-primary"),
+    html.Div([html.H4('Are the entered parameters still like the training data?')], className='py-2'),
+
+    html.Div([
+        dbc.Card(dbc.CardBody([
+            html.P("A model is only reliable for inputs similar to the data it was trained on. A new clinker\
+                    source or a change of additive can shift C3A, Na2O or other parameters away from the\
+                    dataset. Every predicted sample is compared with the dataset distribution of each\
+                    parameter. Population stability index (PSI) below 0.1 - stable, 0.1-0.25 - moderate\
+                    shift, above 0.25 - significant shift, the models should be retrained. Counts are\
+                    combined across all worker processes of the server and updated every few seconds.",
+                   style=dict(textAlign="left"))
+        ]))
+    ]),
+
+    html.Div([html.Output(id='drift-samples')], className='row mx-auto py-2'),
+    dcc.Graph(id='drift-graph'),
+    html.Div([dash_table.DataTable(id='drift-table',
+        columns=[{'id': c, 'name': c} for c in ['parameter', 'PSI', 'KS', 'status']],
+        style_header={"backgroundColor": "#1E90FF", "color": "white", 'textAlign': 'center'},
+        style_cell={"width": "90px", "fontSize": "10pt", 'textAlign': 'center'},
+        style_data_conditional=[
+            {'if': {'filter_query': '{status} = "moderate"'}, 'color': 'orange'},
+            {'if': {'filter_query': '{status} = "significant"'}, 'color': 'red'},
+        ])], className='py-2'),
+    dcc.Interval(id='drift-interval', interval=10 * 1000),
+])
+
+
+@app.callback(
+    Output('drift-graph', 'figure'),
+    Output('drift-table', 'data'),
+    Output('drift-samples', 'children'),
+    Input('drift-interval', 'n_intervals'),
+    State('url', 'search'),
+    State('plant', 'data'))
+
+def drift_scores(n, search, plant_id):
+    try:
+        monitor = get_monitor(get_plant(search, plant_id))
+    except KeyError:
+        return go.Figure(), [], 'unknown plant, no drift scores available'
+    scores = pd.DataFrame([
+        {'parameter': feature, 'PSI': s['psi'], 'KS': s['ks'], 'status': drift_status(s['psi'])}
+        for feature, s in monitor.scores().items()
+    ])
+    fig = px.bar(scores, x='parameter', y='PSI', color='status',
+                 color_discrete_map={'stable': '#1E90FF', 'moderate': 'orange', 'significant': 'red'})
+    fig.add_hline(y=PSI_MODERATE, line_dash='dot', line_color='orange')
+    fig.add_hline(y=PSI_SIGNIFICANT, line_dash='dot', line_color='red')
+    fig.update_layout(margin={'l': 40, 'b': 40, 't': 10, 'r': 0})
+    return fig, scores.to_dict('records'), f'samples predicted since start (all workers): {monitor.samples}'
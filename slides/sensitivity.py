@@ -0,0 +1,95 @@
+from app import app
+
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_bootstrap_components as dbc
+from dash.dependencies import Input, Output, State
+from plotly.subplots import make_subplots
+import plotly.graph_objs as go
+from utils import FEATURES, MODEL_NAMES, TARGET
+from registry import get_plant
+from dependence import dependence_curves
+
+
+content = html.Div(style=dict(textAlign='center', border='1px'), children=[
+
+    html.H2(id='intro-div'),
+    html.Br(), html.Hr([], className="divider py-0.5 bg-primary"),
+    html.Div([html.H4('How does the predicted strength respond to one parameter?')], className='py-2'),
+
+    html.Div([
+        dbc.Card(dbc.CardBody([
+            html.P("Select a sample from the dataset and a parameter. The parameter is swept over its\
+                    realistic range while all other parameters of the sample are kept, and every model\
+                    predicts the whole sweep at once (red line). Grey lines are the same sweep for other\
+                    samples of the dataset (individual conditional expectation), the blue line is their\
+                    average (partial dependence).", style=dict(textAlign="left"))
+        ]))
+    ]),
+
+    html.Div([
+        dbc.Col([
+            html.Label('sample №'),
+            dcc.Input(id='sensitivity-sample', type='number', min=0, step=1, value=0, debounce=True),
+        ], width=3),
+        dbc.Col([
+            html.Label('parameter'),
+            dcc.Dropdown(
+                id='sensitivity-feature',
+                options=[{'label': i, 'value': i} for i in FEATURES],
+                value='SO₃, %'
+            ),
+        ], width=4),
+        dbc.Col([
+            html.Label('strength'),
+            dcc.Dropdown(id='sensitivity-target', options=[{'label': TARGET, 'value': TARGET}], value=TARGET),
+        ], width=3),
+    ], className='row py-2 justify-content-center'),
+
+    html.Div([html.Output(id='sensitivity-danger', style={'color': 'red'})]),
+    dcc.Loading(dcc.Graph(id='sensitivity-graph')),
+])
+
+
+@app.callback(
+    Output('sensitivity-graph', 'figure'),
+    Output('sensitivity-danger', 'children'),
+    Output('sensitivity-target', 'options'),
+    Input('sensitivity-sample', 'value'),
+    Input('sensitivity-feature', 'value'),
+    Input('sensitivity-target', 'value'),
+    State('url', 'search'),
+    State('plant', 'data'))
+
+def sensitivity(sample, feature, target, search, plant_id):
+    try:
+        plant = get_plant(search, plant_id)
+    except KeyError:
+        return go.Figure(), 'unknown plant, no prediction available', []
+    options = [{'label': t, 'value': t} for t in plant.targets]
+    # the input allows any number, a fractional sample is rejected rather than truncated
+    if sample is None or sample != int(sample) or not 0 <= sample < len(plant.Z) or feature not in FEATURES:
+        return go.Figure(), f'select a whole sample number between 0 and {len(plant.Z) - 1}', options
+    sample = int(sample)
+
+    result = dependence_curves(plant, plant.Z.iloc[sample].tolist(), feature)
+    # all horizons are cached together, switching the strength needs no new predictions
+    k = plant.targets.index(target) if target in plant.targets else 0
+    grid = result['grid']
+    fig = make_subplots(rows=1, cols=len(MODEL_NAMES), shared_yaxes=True, subplot_titles=MODEL_NAMES)
+    for col, name in enumerate(MODEL_NAMES, start=1):
+        curves = {curve: values[..., k] for curve, values in result['curves'][name].items()}
+        # all ICE curves of a model in one trace, separated by gaps
+        ice_x = [x for _ in curves['ice'] for x in list(grid) + [None]]
+        ice_y = [y for line in curves['ice'] for y in list(line) + [None]]
+        fig.add_trace(go.Scatter(x=ice_x, y=ice_y, mode='lines', line=dict(color='lightgrey', width=1),
+                                 name='ICE', legendgroup='ice', showlegend=col == 1), row=1, col=col)
+        fig.add_trace(go.Scatter(x=grid, y=curves['pd'], mode='lines', line=dict(color='#1E90FF', width=3),
+                                 name='partial dependence', legendgroup='pd', showlegend=col == 1), row=1, col=col)
+        fig.add_trace(go.Scatter(x=grid, y=curves['base'], mode='lines', line=dict(color='red', width=2),
+                                 name=f'sample {sample}', legendgroup='base', showlegend=col == 1), row=1, col=col)
+        fig.update_xaxes(title=feature, row=1, col=col)
+    fig.update_yaxes(title=f'predicted {plant.targets[k]}', row=1, col=1)
+    fig.update_layout(margin={'l': 40, 'b': 40, 't': 40, 'r': 0}, height=450,
+                      legend=dict(orientation='h', yanchor='bottom', y=-0.35))
+    return fig, '', options
@@ -1,59 +1,65 @@
 from app import app
 
+import threading
+
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
-from utils import model_list
+from dash.dependencies import Input, Output, State
+from utils import model_list, build_models, predict_horizons, MODEL_NAMES, TARGET
+from registry import get_plant, model_version
 import pandas as pd
 
-from sklearn.metrics import mean_squared_error, max_error, mean_absolute_error
+from sklearn.metrics import r2_score, mean_squared_error, max_error, mean_absolute_error
 from plotly.subplots import make_subplots
 import plotly.graph_objs as go
 import plotly.express as px
 from sklearn.model_selection import cross_val_score
-from sklearn.model_selection import train_test_split
+from training import shared_split
 
 
 
-df1 = pd.read_csv('data.csv', sep = ',')
+# the SO3 optimization example is a fixed trial dataset, not one of the plants
 so3 = pd.read_csv('data2.csv', sep = ',')
 Z2 =so3[['R 008, %','SO₃, %', 'additive1, g/t', 'additive2, g/t',
  't, cement, ° С', 'moisture,%', 'Free_lime,%',
        'limestone,%', 'Eq.Na2O,%', 'C3S%', 'C3A%', 'LOI,%']]
 Y2 = so3['2 days MPa']
-Z1 =df1[['R 008, %','SO₃, %', 'additive1, g/t', 'additive2, g/t',
-'t, cement, ° С', 'moisture,%', 'Free_lime,%',
-       'limestone,%', 'Eq.Na2O,%', 'C3S%', 'C3A%', 'LOI,%']]
-Y = df1['2 days MPa']
-modeldataframe = pd.DataFrame({'model': []})
-model_list( Z1, Y)
-modeldataframe['model'] = model_list(Z1, Y)
-x_train, x_test, y_train, y_test = train_test_split(Z1, Y, test_size=15,
- random_state=42)
-
-def score1(x):
-    return round(x.score(x_test, y_test),2)
-def mse(x):
-    return round( mean_squared_error(x.predict(x_test),y_test),2)
-def maxe(x):
-    return  round(max_error(x.predict(x_test),y_test),2)
-def mabse(x):
-    return  round(mean_absolute_error(x.predict(x_test),y_test),2)
-def cvs (x):
-    return round(cross_val_score ( x , Z1 , Y, cv =5).mean(),2)
-
-modeldataframe['r_squared'] = modeldataframe['model'].apply(score1)
-modeldataframe['mean_squared_error'] = modeldataframe['model'].apply(mse)
-modeldataframe['max error'] = modeldataframe['model'].apply(maxe)
-modeldataframe['mean_absolute_error'] = modeldataframe['model'].apply(mabse)
-modeldataframe['cross-validation score'] = modeldataframe['model'].apply(cvs)
-
-
-modeldata1 = modeldataframe
-modeldata1['model']= ['Ridge regression',  'HistGradientBoosting regression',
- 'Huber', 'Lasso', 'ExtraTreesRegressor' ]
+so3models = model_list(Z2, Y2)
+
+METRIC_COLUMNS = ['model', 'r_squared', 'mean_squared_error', 'max error', 'mean_absolute_error',
+                  'cross-validation score']
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def model_metrics(plant):
+    """
+    Test-set metrics of a plant's models on the 2 days strength, computed once per model version.
+    """
+    version = model_version(plant)
+    with _metrics_lock:
+        if version in _metrics:
+            return _metrics[version]
+    x_train, x_test, y_train, y_test = shared_split(plant.Z, plant.Y)
+    y_test = y_test[TARGET] if y_test.ndim > 1 else y_test
+    rows = []
+    # cross-validation refits unfitted 2 days models, the plant's models stay untouched
+    for name, model, estimator in zip(MODEL_NAMES, plant.models, build_models(plant.df[TARGET])):
+        predicted = predict_horizons(model, x_test)[:, 0]
+        rows.append({
+            'model': name,
+            'r_squared': round(r2_score(y_test, predicted), 2),
+            'mean_squared_error': round(mean_squared_error(predicted, y_test), 2),
+            'max error': round(max_error(predicted, y_test), 2),
+            'mean_absolute_error': round(mean_absolute_error(predicted, y_test), 2),
+            'cross-validation score': round(cross_val_score(estimator, plant.Z, plant.df[TARGET], cv=5).mean(), 2),
+        })
+    with _metrics_lock:
+        _metrics[version] = rows
+    return rows
 
 content = html.Div(style=dict(textAlign='center', border='1px'),children=[
 
@@ -80,12 +86,13 @@ content = html.Div(style=dict(textAlign='center', border='1px'),children=[
 
     html.Div([html.H6("This is the ML performance metrics")], className = "row py-2 mx-auto"),
 
-    html.Div([dash_table.DataTable(data = modeldata1.to_dict("records"),
+    html.Div([html.Output(id='metrics-danger', style={'color': 'red'})]),
+    html.Div([dcc.Loading(dash_table.DataTable(id = 'metrics-table',
     columns =  [{"id": c, "name": c, "selectable": True} for c in
-      modeldata1.columns],
+      METRIC_COLUMNS],
     style_header={ "backgroundColor": "#1E90FF", "color": "white",'textAlign': 'center',
     "fontSize": "8pt" },fixed_rows={"headers": True},style_cell={"width": "90px",
-    "fontSize": "10pt",'textAlign': 'center'} )], className = "py-2"),
+    "fontSize": "10pt",'textAlign': 'center'} ))], className = "py-2"),
     html.Div([html.P("*cross validation score - 5-fold average cross validation score")], className='row mx-auto'),
 
 
@@ -103,7 +110,7 @@ content = html.Div(style=dict(textAlign='center', border='1px'),children=[
     html.Div([
         dcc.Dropdown(
             id='models',
-            options=[{'label': i, 'value': i} for i in modeldata1['model']],
+            options=[{'label': i, 'value': i} for i in MODEL_NAMES],
             value='Ridge regression'
         ),
     ], className = 'py-2'),
@@ -115,6 +122,19 @@ content = html.Div(style=dict(textAlign='center', border='1px'),children=[
 ])
 
 
+@app.callback(
+    Output('metrics-table', 'data'),
+    Output('metrics-danger', 'children'),
+    Input('url', 'search'),
+    State('plant', 'data'))
+
+def metrics_table(search, plant_id):
+    try:
+        return model_metrics(get_plant(search, plant_id)), ''
+    except KeyError:
+        return [], 'unknown plant, no model metrics available'
+
+
 @app.callback(
     Output('so3optimization', 'figure'),
     Input('models', 'value'))
@@ -122,8 +142,8 @@ content = html.Div(style=dict(textAlign='center', border='1px'),children=[
 def so3opt(models):
     fig = px.scatter(Z2, x = 'SO₃, %', y = Y2)
     fig.update_layout(legend=dict(yanchor="top",y=0.99,xanchor="left", x=0.01))
-    u = modeldata1['model'].to_list().index(models)
-    fig.add_trace(go.Scatter(x= Z2['SO₃, %'],y=model_list(Z2,Y2)[u].predict(Z2),
+    u = MODEL_NAMES.index(models)
+    fig.add_trace(go.Scatter(x= Z2['SO₃, %'],y=so3models[u].predict(Z2),
     mode='markers',
     marker=dict(
         size=4,
@@ -7,9 +7,7 @@ import dash_table
 import dash_bootstrap_components as dbc
 import pandas as pd
 import numpy as np
-
-df = pd.read_csv('data.csv', sep = ',')
-df.rename(columns ={'Unnamed: 0': 'sample №'}, inplace=True)
+from registry import get_plant
 
 
 description = pd.DataFrame({'Name': ['2 days MPa','R 008, %', 'SO₃, %',
@@ -43,8 +41,8 @@ html.Div([
 
     html.Div([( html.H6 ('The dataset:'))],className = 'row mx-auto py-2'),
 
-    html.Div([dash_table.DataTable(id = 'id', data = df.to_dict("records"),
-     columns = [{"id": c, "name": c, "selectable": True} for c in  df.columns],
+    html.Div([html.Output(id='dataset-danger', style={'color': 'red'})]),
+    html.Div([dash_table.DataTable(id = 'id',
     style_header={ "backgroundColor": "#1E90FF", "fontWeight": "bold","color": "white",
     'textAlign': 'center'
     },  fixed_rows={"headers": True},style_cell={"width": "70px", "fontSize": "8pt",
@@ -76,3 +74,18 @@ html.Div([
 
   ], className = 'row mx-auto py-2'),
 ])
+
+
+@app.callback(
+    Output('id', 'data'),
+    Output('id', 'columns'),
+    Output('dataset-danger', 'children'),
+    Input('url', 'search'),
+    State('plant', 'data'))
+
+def dataset_table(search, plant_id):
+    try:
+        df = get_plant(search, plant_id).df.rename(columns={'Unnamed: 0': 'sample №'})
+    except KeyError:
+        return [], [], 'unknown plant, no dataset available'
+    return df.to_dict("records"), [{"id": c, "name": c, "selectable": True} for c in df.columns], ''
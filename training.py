@@ -0,0 +1,170 @@
+"""
+Parallel, resource-aware fitting of independent estimators.
+
+Estimators are fitted concurrently in a joblib process pool within a
+per-process core budget (TRAINING_CORES, by default the cores shared
+among the WEB_CONCURRENCY server workers). Cores left over after one per
+estimator go to the estimators that can use them (n_jobs, or OpenMP
+threads for HistGradientBoosting). Small datasets are fitted in-process, where starting
+worker processes would cost more than it saves. Every fit reports its wall
+time and peak memory.
+
+    python training.py [plant_id]
+
+TRAINING_PARALLEL_MIN_ROWS=0 forces the process pool on a small dataset.
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import psutil
+from joblib import Parallel, delayed
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from threadpoolctl import threadpool_limits
+
+# the budget is per process: without TRAINING_CORES each of the WEB_CONCURRENCY
+# gunicorn workers gets an equal share of the machine's cores, 2 workers as in the Procfile
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))
+CORE_BUDGET = int(os.environ.get('TRAINING_CORES', max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+# below this many training rows the estimators are fitted one after another in-process
+PARALLEL_MIN_ROWS = int(os.environ.get('TRAINING_PARALLEL_MIN_ROWS', 5000))
+SPLIT_CACHE_SIZE = 8
+
+_splits = OrderedDict()
+_splits_lock = threading.Lock()
+
+
+# -----------------------------------
+# Shared Train/Test Split
+# -----------------------------------
+
+def _fingerprint(data):
+    return hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes()).hexdigest()
+
+
+def shared_split(Z, Y, test_size=15, random_state=42):
+    """
+    train_test_split cached by data content, so every caller gets the same split.
+    """
+    key = (_fingerprint(Z), _fingerprint(Y), test_size, random_state)
+    with _splits_lock:
+        if key in _splits:
+            _splits.move_to_end(key)
+            return _splits[key]
+    split = tuple(train_test_split(Z, Y, test_size=test_size, random_state=random_state))
+    with _splits_lock:
+        _splits[key] = split
+        while len(_splits) > SPLIT_CACHE_SIZE:
+            _splits.popitem(last=False)
+    return split
+
+
+# -----------------------------------
+# Core Allocation
+# -----------------------------------
+
+def _n_jobs_param(estimator):
+    # the per-horizon wrappers of utils.build_models (HorizonRegressor, PendingHorizonRegressor)
+    # fit their clones one after another, their threads go to the estimator they wrap
+    params = estimator.get_params()
+    if 'estimator' in params:
+        return 'estimator__n_jobs' if 'estimator__n_jobs' in params else None
+    return 'n_jobs' if 'n_jobs' in params else None
+
+
+def _parallel_capable(estimator):
+    base = estimator.get_params().get('estimator', estimator)
+    return _n_jobs_param(estimator) is not None or isinstance(base, HistGradientBoostingRegressor)
+
+
+def allocate_threads(estimators, budget=CORE_BUDGET):
+    """
+    Threads per estimator: one each, plus the rest of the budget shared by parallel-capable ones.
+    """
+    threads = [1] * len(estimators)
+    capable = [i for i, e in enumerate(estimators) if _parallel_capable(e)]
+    spare = budget - len(estimators)
+    if spare > 0 and capable:
+        for n, i in enumerate(capable):
+            threads[i] += spare // len(capable) + (1 if n < spare % len(capable) else 0)
+    return threads
+
+
+# -----------------------------------
+# Fitting
+# -----------------------------------
+
+def _fit_one(estimator, X, y, threads):
+    key = _n_jobs_param(estimator)
+    if key is not None:
+        n_jobs = estimator.get_params()[key]
+        estimator.set_params(**{key: threads})
+
+    process = psutil.Process()
+    baseline = process.memory_info().rss
+    peak = [baseline]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(0.05):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    # caps OpenMP (HistGradientBoosting) and BLAS (linear models) threads to the allocation
+    with threadpool_limits(limits=threads):
+        estimator.fit(X, y)
+    seconds = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    peak[0] = max(peak[0], process.memory_info().rss)
+    # predictions of single samples are faster without a thread pool, and the
+    # model version must not depend on the machine the model was trained on
+    if key is not None:
+        estimator.set_params(**{key: n_jobs})
+
+    return estimator, {'fit_seconds': round(seconds, 3), 'threads': threads,
+                       'peak_mb': round((peak[0] - baseline) / 2 ** 20, 1)}
+
+
+def fit_models(estimators, X, y, names=None, budget=CORE_BUDGET):
+    """
+    Fit independent estimators concurrently within the core budget.
+
+    Returns the fitted estimators, in order, and a report with the fit time,
+    thread allocation and peak memory increase of each.
+    """
+    names = names or [type(e).__name__ for e in estimators]
+    if len(X) < PARALLEL_MIN_ROWS or budget < 2:
+        # one at a time, so each parallel-capable estimator may use the whole budget
+        threads = [budget if _parallel_capable(e) else 1 for e in estimators]
+        results = [_fit_one(e, X, y, t) for e, t in zip(estimators, threads)]
+    else:
+        threads = allocate_threads(estimators, budget)
+        results = Parallel(n_jobs=min(len(estimators), budget))(
+            delayed(_fit_one)(e, X, y, t) for e, t in zip(estimators, threads)
+        )
+
+    models = [model for model, _ in results]
+    report = [dict(model=name, rows=len(X), **stats) for name, (_, stats) in zip(names, results)]
+    return models, report
+
+
+if __name__ == '__main__':
+    from registry import DEFAULT_PLANT, plant_data_path, read_dataset
+    from utils import FEATURES, TARGET, build_models, dataset_y, MODEL_NAMES
+
+    plant_id = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PLANT
+    df = read_dataset(plant_data_path(plant_id))
+    df = df.dropna(subset=[TARGET])
+    x_train, x_test, y_train, y_test = shared_split(df[FEATURES], dataset_y(df))
+    start = time.perf_counter()
+    models, report = fit_models(build_models(y_train), x_train, y_train, MODEL_NAMES)
+    print(pd.DataFrame(report).to_string(index=False))
+    print(f'total {time.perf_counter() - start:.2f}s on a budget of {CORE_BUDGET} cores')
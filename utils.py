@@ -1,3 +1,6 @@
+import logging
+
+import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.linear_model import Ridge
 
@@ -8,22 +11,102 @@ from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import ExtraTreesRegressor
 from sklearn.linear_model import HuberRegressor
 from sklearn.model_selection import train_test_split
+from sklearn.base import BaseEstimator, RegressorMixin, clone
 
+from training import fit_models, shared_split
 
+logger = logging.getLogger(__name__)
 
-def model_list( Z1, Y):
+
+# predictors and target shared by every slide and every plant dataset
+FEATURES = ['R 008, %', 'SO₃, %', 'additive1, g/t', 'additive2, g/t', 't, cement, ° С',
+            'moisture,%', 'Free_lime,%', 'limestone,%', 'Eq.Na2O,%', 'C3S%', 'C3A%', 'LOI,%']
+TARGET = '2 days MPa'
+# strength horizons the lab may record, TARGET first; the models predict all present in a dataset
+TARGETS = ['2 days MPa', '7 days MPa', '28 days MPa']
+TARGET_LABELS = {'2 days MPa': '2d', '7 days MPa': '7d', '28 days MPa': '28d'}
+# display names, in the order model_list returns the models
+MODEL_NAMES = ['Ridge regression', 'HistGradientBoosting regression', 'Huber', 'Lasso', 'ExtraTreesRegressor']
+
+
+def dataset_targets(df):
+    # a horizon column without any measurement yet is not predicted
+    return [t for t in TARGETS if t in df.columns and df[t].notna().any()]
+
+
+def dataset_y(df):
+    # the TARGET series, or a frame of all horizons when the lab recorded more than one
+    targets = dataset_targets(df)
+    return df[targets] if len(targets) > 1 else df[TARGET]
+
+
+def predict_horizons(model, X):
+    # predictions as a (samples, horizons) array for single and multi-output models
+    return np.asarray(model.predict(X)).reshape(len(X), -1)
+
+
+class HorizonRegressor(BaseEstimator, RegressorMixin):
+    # one clone of the estimator per horizon, each fitted on the rows where that horizon is measured,
+    # for estimators without native multi-output support (Huber, HistGradientBoosting)
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def fit(self, X, Y):
+        Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+        self.estimators_ = []
+        for k in range(Y.shape[1]):
+            measured = ~np.isnan(Y[:, k])
+            self.estimators_.append(clone(self.estimator).fit(X[measured], Y[measured, k]))
+        return self
+
+    def predict(self, X):
+        return np.column_stack([e.predict(X) for e in self.estimators_])
+
+
+class PendingHorizonRegressor(BaseEstimator, RegressorMixin):
+    # one native multi-output fit on the rows with every horizon measured; when later horizons
+    # are still pending for some rows, a second clone fits the first horizon on all rows
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def fit(self, X, Y):
+        Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+        complete = ~np.isnan(Y).any(axis=1)
+        self.estimator_ = clone(self.estimator).fit(X[complete], Y[complete])
+        self.first_ = None
+        if not complete.all():
+            measured = ~np.isnan(Y[:, 0])
+            self.first_ = clone(self.estimator).fit(X[measured], Y[measured, 0])
+        return self
+
+    def predict(self, X):
+        predicted = np.asarray(self.estimator_.predict(X), dtype=float).reshape(len(X), -1)
+        if self.first_ is not None:
+            predicted[:, 0] = self.first_.predict(X)
+        return predicted
+
+
+def build_models(Y):
     Ridgem =Ridge(alpha=0.001,fit_intercept = True)
     Huber = HuberRegressor(max_iter=3000)
     HistGradientBoosting = HistGradientBoostingRegressor(learning_rate=0.2, max_leaf_nodes =25, max_iter = 100,  min_samples_leaf = 10)
     Lassom = Lasso(alpha = 0.001  )
 
     Polinomalreg = ExtraTreesRegressor(n_estimators=200, random_state=3, max_depth=20)
-    x_train, x_test, y_train, y_test = train_test_split(Z1, Y, test_size=15, random_state=42)
-    Ridgem.fit(x_train, y_train)
-    Huber.fit( x_train , y_train )
-    HistGradientBoosting.fit(x_train, y_train)
-    Lassom.fit( x_train , y_train )
-    Polinomalreg.fit( x_train , y_train )
-
-    modeldata = [Ridgem,  HistGradientBoosting, Huber, Lassom, Polinomalreg ]
+
+    if getattr(Y, 'ndim', 1) > 1:
+        # Ridge, Lasso and ExtraTrees fit all horizons in one pass, Huber and HistGradientBoosting
+        # need one estimator per horizon; later horizons are missing until their tests are done
+        Ridgem, Lassom, Polinomalreg = (PendingHorizonRegressor(m) for m in (Ridgem, Lassom, Polinomalreg))
+        Huber, HistGradientBoosting = (HorizonRegressor(m) for m in (Huber, HistGradientBoosting))
+
+    return [Ridgem,  HistGradientBoosting, Huber, Lassom, Polinomalreg ]
+
+
+def model_list( Z1, Y):
+    x_train, x_test, y_train, y_test = shared_split(Z1, Y)
+    modeldata, report = fit_models(build_models(Y), x_train, y_train, MODEL_NAMES)
+    for r in report:
+        logger.info("Fitted %s on %s rows: %ss, %s threads, peak +%s MB",
+                    r['model'], r['rows'], r['fit_seconds'], r['threads'], r['peak_mb'])
     return modeldata